@@ -1,23 +1,68 @@
 import os
+import asyncio
+import base64
+import functools
+import hashlib
+import re
 import requests
 import io
+import threading
+import time
 import uuid
-from flask import Flask, render_template, request, jsonify, session, send_from_directory
+import aiohttp
+import orjson
+from concurrent.futures import Future, ThreadPoolExecutor
+from cachetools import TTLCache
+from flask import Flask, render_template, request, jsonify, session, send_from_directory, Response
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event as sa_event
+from sqlalchemy.engine import Engine
 from flask_sqlalchemy import SQLAlchemy
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 
 try:
-    from PIL import Image
+    from PIL import Image, ImageOps
     PILLOW_AVAILABLE = True
+    # The requirements file asks for pillow-simd + libjpeg-turbo; warn when
+    # the runtime ended up with a slow stock build so the 2-6x decode/resize
+    # win isn't silently lost.
+    try:
+        from PIL import features as pil_features
+        if not pil_features.check_feature("libjpeg_turbo"):
+            print("Warning: Pillow is not linked against libjpeg-turbo; JPEG decode will be slow.")
+    except Exception:
+        pass
 except ImportError:
     PILLOW_AVAILABLE = False
     print("Warning: Pillow not installed. Image uploads will be disabled.")
 
+# Optional accelerator: libvips processes images as a demand-driven tiled
+# pipeline, so large uploads never materialize a full decoded buffer and its
+# SIMD resize kernels beat Pillow's. Used when installed, otherwise we fall
+# back to the Pillow path below.
+try:
+    import pyvips
+    PYVIPS_AVAILABLE = True
+except (ImportError, OSError):
+    PYVIPS_AVAILABLE = False
+
 load_dotenv()
 
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson's native encoder, so the large nested
+    payloads from /api/search and /api/images skip stdlib json entirely."""
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "dev_default")
+app.json = ORJSONProvider(app)
 
 # Configuration
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -28,22 +73,55 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
 db = SQLAlchemy(app)
 
+@sa_event.listens_for(Engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tunes SQLite for this read-heavy workload: WAL lets readers proceed
+    while a writer commits, NORMAL sync is safe under WAL, and the mmap /
+    page-cache sizes keep hot pages out of syscalls."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-64000")
+    cursor.close()
+
 # --- Models ---
 class ImageModel(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    filename = db.Column(db.String(100), nullable=False) # The optimized original
-    thumbnail_filename = db.Column(db.String(100), nullable=False)
+    filename = db.Column(db.String(100), nullable=True) # The optimized original (null while processing)
+    thumbnail_filename = db.Column(db.String(100), nullable=True)
     title = db.Column(db.String(200), nullable=True)
-    
+    status = db.Column(db.String(20), nullable=False, default="ready", server_default="ready") # pending | ready | failed
+
     def to_dict(self):
         return {
             "id": self.id,
             "title": self.title,
-            "original_url": f"/static/images/{self.filename}",
-            "thumbnail_url": f"/static/images/{self.thumbnail_filename}"
+            "status": self.status,
+            "original_url": f"/static/images/{self.filename}" if self.filename else None,
+            "thumbnail_url": f"/static/images/{self.thumbnail_filename}" if self.thumbnail_filename else None
         }
 
+class QidLabel(db.Model):
+    """Persisted tier of the QID -> English label cache."""
+    qid = db.Column(db.String(32), primary_key=True)
+    label = db.Column(db.String(500), nullable=False)
+    fetched_at = db.Column(db.Integer, nullable=False)
+
 # --- Helpers ---
+# Pillow's decode/encode paths release the GIL, so handing the CPU-heavy work
+# to a pool lets concurrent uploads actually run in parallel across cores
+# instead of serializing inside the request threads.
+IMG_POOL = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+# Shared WebP encoder settings. method/effort 4 is libwebp's speed/size sweet
+# spot for full-size output; thumbnails use the cheapest effort since extra
+# work buys almost nothing on so few pixels.
+WEBP_QUALITY = 80
+WEBP_METHOD = 4
+WEBP_THUMB_METHOD = 1
+
 def process_image(file_storage):
     """
     Optimizes the uploaded image:
@@ -51,32 +129,74 @@ def process_image(file_storage):
     2. Generates a thumbnail (max 300px, LANCZOS)
     Returns tuple (original_filename, thumbnail_filename)
     """
-    if not PILLOW_AVAILABLE:
+    if not PILLOW_AVAILABLE and not PYVIPS_AVAILABLE:
         raise ImportError("Pillow library is not available. Image processing is disabled.")
 
     # Generate unique filenames
     unique_id = uuid.uuid4().hex
     original_filename = f"{unique_id}.webp"
     thumbnail_filename = f"{unique_id}_thumb.webp"
-    
+
     original_path = os.path.join(app.config['UPLOAD_FOLDER'], original_filename)
     thumbnail_path = os.path.join(app.config['UPLOAD_FOLDER'], thumbnail_filename)
 
+    # Fast path: stream through libvips without holding the decoded image.
+    # thumbnail_buffer shrinks JPEGs on load (same trick as Image.draft)
+    # and writes WebP via libwebp in a single pass.
+    if PYVIPS_AVAILABLE:
+        raw = file_storage.read()
+        # autorot() bakes the EXIF orientation into the pixels; strip=True
+        # would otherwise drop the tag and leave phone photos sideways
+        # (thumbnail_buffer already auto-rotates by default).
+        pyvips.Image.new_from_buffer(raw, "").autorot().webpsave(
+            original_path, Q=WEBP_QUALITY, effort=WEBP_METHOD, strip=True)
+        pyvips.Image.thumbnail_buffer(raw, 300, height=300, size="down").webpsave(
+            thumbnail_path, Q=WEBP_QUALITY, effort=WEBP_THUMB_METHOD, strip=True)
+        return original_filename, thumbnail_filename
+
     # Open image using Pillow
     img = Image.open(file_storage)
-    
-    # Allow simple format conversion (RGB for WebP)
-    if img.mode in ("RGBA", "P"):
-        img = img.convert("RGBA")
-    else:
+    is_jpeg = img.format == "JPEG"
+
+    # Apply EXIF orientation through Pillow's native transpose; phone photos
+    # would otherwise come out rotated. Stays in C, no per-pixel Python work.
+    img = ImageOps.exif_transpose(img)
+
+    # Convert only when needed: convert() always copies the pixel buffer, so
+    # RGB/RGBA sources pass through untouched, and palette images keep alpha
+    # only when they actually carry transparency.
+    if img.mode == "P":
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+    elif img.mode not in ("RGB", "RGBA"):
         img = img.convert("RGB")
 
-    # 1. Save Optimized Original
-    img.save(original_path, "WEBP", quality=80, optimize=True)
+    # 1. Save Optimized Original (optimize=True would map to the much slower
+    # method=6 path for no visible gain here).
+    img.save(original_path, "WEBP", quality=WEBP_QUALITY, method=WEBP_METHOD)
 
-    # 2. Generate Thumbnail
-    img.thumbnail((300, 300), Image.Resampling.LANCZOS)
-    img.save(thumbnail_path, "WEBP", quality=80, optimize=True)
+    # 2. Generate Thumbnail.
+    if is_jpeg:
+        # JPEG: a fresh decode with draft() lets libjpeg IDCT at a reduced
+        # scale (1/2, 1/4, 1/8), so LANCZOS shrinks a much smaller buffer —
+        # cheaper than reusing the full-size decode above.
+        file_storage.seek(0)
+        thumb = Image.open(file_storage)
+        thumb.draft("RGB", (600, 600))
+        thumb = ImageOps.exif_transpose(thumb)
+        # JPEG has no alpha; only grayscale/CMYK sources need converting.
+        if thumb.mode != "RGB":
+            thumb = thumb.convert("RGB")
+    else:
+        # Other formats have no draft() shortcut, so decoding again would just
+        # repeat the work. Reuse the decoded image and box-shrink it by an
+        # integer factor first: reduce() is a specialized SIMD path, far
+        # cheaper than running LANCZOS over the full-size pixels.
+        thumb = img
+        factor = max(thumb.size) // 600
+        if factor > 1:
+            thumb = thumb.reduce(factor)
+    thumb.thumbnail((300, 300), Image.Resampling.LANCZOS)
+    thumb.save(thumbnail_path, "WEBP", quality=WEBP_QUALITY, method=WEBP_THUMB_METHOD)
 
     return original_filename, thumbnail_filename
 
@@ -87,10 +207,31 @@ BOT_PASSWORD = os.getenv("BOT_PASSWORD")
 
 USER_AGENT = "DepictsEditor/1.0 (https://github.com/example/depicts-editor; tool_maintainer@example.com)"
 
-def get_commons_session():
-    """Authenticates and returns a session with a CSRF token."""
+def _make_http_session():
+    """Builds a pooled session (keep-alive + retries) for MediaWiki API calls."""
     s = requests.Session()
     s.headers.update({"User-Agent": USER_AGENT})
+    adapter = HTTPAdapter(
+        pool_connections=32,
+        pool_maxsize=64,
+        max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504])
+    )
+    s.mount("https://", adapter)
+    return s
+
+# Shared sessions so repeated API calls reuse TCP/TLS connections instead of
+# paying a fresh handshake per request.
+COMMONS_HTTP = _make_http_session()
+WIKIDATA_HTTP = _make_http_session()
+
+def _get_json(http, url, params):
+    """GET + orjson decode. Category-search responses run to hundreds of KB,
+    where orjson.loads is several times faster than requests' stdlib .json()."""
+    return orjson.loads(http.get(url, params=params).content)
+
+def get_commons_session():
+    """Authenticates and returns a session with a CSRF token."""
+    s = _make_http_session()
 
     # 1. Login
     if BOT_USERNAME and BOT_PASSWORD:
@@ -124,18 +265,408 @@ def get_csrf_token(s):
     }).json()
     return tokens["query"]["tokens"]["csrftoken"]
 
+# Authenticated session + CSRF token cache. A fresh login costs three round
+# trips (login token, login, CSRF token) per edit, and CSRF tokens stay valid
+# far longer than a single request, so keep the warm pair at module scope.
+_AUTH = {"session": None, "csrf": None, "expires": 0.0}
+_auth_lock = threading.Lock()
+
+def get_authed_session():
+    """Returns a (session, csrf_token) pair, re-authenticating only when the
+    cached pair has expired or been invalidated."""
+    with _auth_lock:
+        if _AUTH["session"] is None or time.time() > _AUTH["expires"]:
+            s = get_commons_session()
+            _AUTH.update(session=s, csrf=get_csrf_token(s), expires=time.time() + 3300)
+        return _AUTH["session"], _AUTH["csrf"]
+
+def invalidate_authed_session():
+    """Drops the cached login so the next edit re-authenticates."""
+    with _auth_lock:
+        _AUTH.update(session=None, csrf=None, expires=0.0)
+
+# --- Wikidata label cache ---
+# QID -> label lookups are extremely repetitive (Q5 "human", Q146 "cat", ...)
+# and labels essentially never change at request timescale. Cache them in two
+# tiers: an in-process TTLCache for the hot path (bounded, day-long entries
+# so a pathological crawl can't grow it without limit), plus the local SQLite
+# DB so restarts don't begin cold. DB rows expire after 7 days.
+LABEL_TTL_SECONDS = 7 * 24 * 3600
+_label_cache = TTLCache(maxsize=50_000, ttl=86_400)
+_label_cache_lock = threading.Lock()
+
+# Shared pool for fanning out independent MediaWiki API calls.
+API_POOL = ThreadPoolExecutor(max_workers=16)
+
+def _fetch_label_chunk(chunk):
+    """Fetches English labels for up to 50 QIDs in one wbgetentities call."""
+    wd_params = {
+        "action": "wbgetentities",
+        "ids": "|".join(chunk),
+        "props": "labels",
+        "languages": "en",
+        "format": "json"
+    }
+    return _get_json(WIKIDATA_HTTP, WIKIDATA_API, wd_params)
+
+def resolve_qid_labels(qids):
+    """
+    Resolves QIDs to English labels, returning a {qid: label} dict.
+    Checks the in-process cache, then the labels table, and only hits
+    Wikidata for QIDs missing from both. Fresh results are written back
+    to both tiers.
+    """
+    labels = {}
+    missing = []
+    with _label_cache_lock:
+        for qid in qids:
+            if qid in _label_cache:
+                labels[qid] = _label_cache[qid]
+            else:
+                missing.append(qid)
+
+    if missing:
+        cutoff = int(time.time()) - LABEL_TTL_SECONDS
+        rows = db.session.execute(
+            db.select(QidLabel).where(QidLabel.qid.in_(missing), QidLabel.fetched_at >= cutoff)
+        ).scalars()
+        db_hits = {row.qid: row.label for row in rows}
+        if db_hits:
+            labels.update(db_hits)
+            with _label_cache_lock:
+                _label_cache.update(db_hits)
+            missing = [q for q in missing if q not in db_hits]
+
+    if missing:
+        chunks = [missing[i:i+50] for i in range(0, len(missing), 50)]
+        fetched = {}
+        for wd_resp in API_POOL.map(_fetch_label_chunk, chunks):
+            if "entities" in wd_resp:
+                for qid, q_data in wd_resp["entities"].items():
+                    fetched[qid] = q_data.get("labels", {}).get("en", {}).get("value", qid)
+        if fetched:
+            now = int(time.time())
+            for qid, label in fetched.items():
+                db.session.merge(QidLabel(qid=qid, label=label, fetched_at=now))
+            db.session.commit()
+            labels.update(fetched)
+            with _label_cache_lock:
+                _label_cache.update(fetched)
+
+    return labels
+
+def warm_label_cache():
+    """Preloads the in-process tier from the labels table (call at startup)."""
+    cutoff = int(time.time()) - LABEL_TTL_SECONDS
+    rows = db.session.execute(db.select(QidLabel).where(QidLabel.fetched_at >= cutoff)).scalars()
+    with _label_cache_lock:
+        for row in rows:
+            _label_cache[row.qid] = row.label
+
+class _MidBatcher:
+    """
+    DataLoader-style micro-batcher for SDC entity fetches. When the UI opens
+    several files at once, each file_details call lands here; callers arriving
+    within the batching window share a single wbgetentities request (the API
+    takes up to 50 ids) instead of one round trip each.
+    """
+    MAX_BATCH = 50
+    WAIT_SECONDS = 0.01
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {} # mid -> Future
+        self._timer = None
+
+    def fetch(self, mid):
+        """Returns the entity dict for one MID (None if the API omitted it)."""
+        with self._lock:
+            fut = self._pending.get(mid)
+            if fut is None:
+                fut = Future()
+                self._pending[mid] = fut
+                if len(self._pending) >= self.MAX_BATCH:
+                    self._flush_locked()
+                elif self._timer is None:
+                    self._timer = threading.Timer(self.WAIT_SECONDS, self._flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        return fut.result()
+
+    def _flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        batch, self._pending = self._pending, {}
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if batch:
+            API_POOL.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch):
+        try:
+            resp = _get_json(COMMONS_HTTP, COMMONS_API, {
+                "action": "wbgetentities",
+                "ids": "|".join(batch),
+                "format": "json"
+            })
+            entities = resp.get("entities", {})
+            for mid, fut in batch.items():
+                fut.set_result(entities.get(mid))
+        except Exception as e:
+            for fut in batch.values():
+                fut.set_exception(e)
+
+MID_BATCHER = _MidBatcher()
+
+# index.html has no per-user variables, so render it once per process and
+# let browsers revalidate with an ETag instead of re-downloading.
+@functools.lru_cache(maxsize=1)
+def _index_html():
+    return render_template("index.html")
+
+@functools.lru_cache(maxsize=1)
+def _index_etag():
+    return hashlib.sha256(_index_html().encode()).hexdigest()[:16]
+
 @app.route("/")
 def index():
-    return render_template("index.html")
+    resp = Response(_index_html(), mimetype="text/html")
+    resp.set_etag(_index_etag())
+    resp.headers["Cache-Control"] = "public, max-age=300"
+    return resp.make_conditional(request)
+
+# Category contents and depicts statements change slowly, so identical
+# searches within a few minutes (retries, multiple users) can share one
+# upstream fan-out. We cache the serialized JSON bytes, not the dict, so
+# cache hits skip re-encoding too.
+_SEARCH_CACHE = TTLCache(maxsize=1024, ttl=300)
+# In-flight searches, keyed like the cache, so concurrent identical requests
+# share one upstream fan-out instead of each running the full pipeline.
+_PENDING_SEARCHES = {}
+_search_cache_lock = threading.Lock()
+
+def _cache_key_title(query):
+    """Canonical category title for the cache/coalescing key. MediaWiki
+    titles are case-sensitive past the first letter of the name, so only the
+    namespace prefix and that first letter are folded — lower-casing the
+    whole query would pin one category's results onto searches for a
+    genuinely different one (e.g. Category:IPhone vs Category:Iphone)."""
+    name = query.strip()
+    if name.lower().startswith("category:"):
+        name = name[len("category:"):]
+    return "Category:" + name[:1].upper() + name[1:]
+
+def _search_response(body, status):
+    resp = Response(body, status=status, mimetype="application/json")
+    if status == 200:
+        resp.headers["Cache-Control"] = "public, max-age=120"
+    return resp
 
 @app.route("/api/search")
 def search():
     try:
-        return _search_impl()
+        key = (
+            _cache_key_title(request.args.get("q", "")),
+            request.args.get("page", 1, type=int),
+            request.args.get("cursor", "")
+        )
+        with _search_cache_lock:
+            cached = _SEARCH_CACHE.get(key)
+        if cached is not None:
+            return _search_response(cached, 200)
+
+        # Coalesce duplicates: the first caller for a key becomes the leader
+        # and runs the pipeline; followers block on its Future and rebuild
+        # their own Response from the shared payload.
+        with _search_cache_lock:
+            fut = _PENDING_SEARCHES.get(key)
+            is_leader = fut is None
+            if is_leader:
+                fut = Future()
+                _PENDING_SEARCHES[key] = fut
+
+        if not is_leader:
+            body, status = fut.result()
+            return _search_response(body, status)
+
+        try:
+            rv = _search_impl()
+            resp, status = (rv if isinstance(rv, tuple) else (rv, rv.status_code))
+            body = resp.get_data()
+            if status == 200:
+                with _search_cache_lock:
+                    _SEARCH_CACHE[key] = body
+            fut.set_result((body, status))
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with _search_cache_lock:
+                _PENDING_SEARCHES.pop(key, None)
+        return _search_response(body, status)
     except Exception as e:
+        # Format the trace once and keep it server-side; under an upstream
+        # outage this path gets hot, and the client only needs the message.
         import traceback
-        traceback.print_exc()
-        return jsonify({"error": str(e), "trace": traceback.format_exc()}), 500
+        tb = traceback.format_exc()
+        app.logger.error("search failed: %s", tb)
+        payload = {"error": str(e)}
+        if app.debug:
+            payload["trace"] = tb
+        return jsonify(payload), 500
+
+PER_PAGE = 10
+
+# Depicts edits are low-velocity, so a short per-MID cache of P180 QID lists
+# lets repeat pageloads skip the wbgetentities batch entirely. add_claim
+# invalidates the edited MID to keep freshness.
+SDC_CACHE = TTLCache(maxsize=100_000, ttl=600)
+_sdc_cache_lock = threading.Lock()
+
+def _attach_depicts(page_files):
+    """
+    Batch-fetches P180 statements (SDC) for the given files and attaches
+    labelled depicts entries in place.
+    """
+    if not page_files:
+        return
+
+    # Get M-IDs (computed once; reused below when enriching)
+    mids = [f"M{f['pageid']}" for f in page_files]
+
+    file_to_qids = {} # mid -> [qid, ...]
+    with _sdc_cache_lock:
+        for mid in mids:
+            cached = SDC_CACHE.get(mid)
+            if cached is not None:
+                file_to_qids[mid] = cached
+
+    # Batch fetch SDC from Commons for the cache misses only
+    miss_mids = [mid for mid in mids if mid not in file_to_qids]
+    if miss_mids:
+        s_params = {
+            "action": "wbgetentities",
+            "ids": "|".join(miss_mids),
+            "format": "json"
+        }
+        s_resp = _get_json(COMMONS_HTTP, COMMONS_API, s_params)
+
+        if "entities" in s_resp:
+            for mid, entity in s_resp["entities"].items():
+                p180 = []
+                claims = entity.get("statements", {}).get("P180", [])
+                for claim in claims:
+                    if claim.get("mainsnak", {}).get("snaktype") == "value":
+                        val = claim["mainsnak"]["datavalue"]["value"]
+                        if val.get("entity-type") == "item": # Should be item
+                             p180.append(val["id"])
+                file_to_qids[mid] = p180
+            with _sdc_cache_lock:
+                for mid in miss_mids:
+                    if mid in file_to_qids:
+                        SDC_CACHE[mid] = file_to_qids[mid]
+
+    # Dicts keep insertion order, so one structure gives both dedup and the
+    # resolve list without the extra set -> list pass and allocation.
+    qid_order = {} # qid -> None
+    for mid in mids:
+        for qid in file_to_qids.get(mid, ()):
+            qid_order[qid] = None
+
+    # Batch fetch Labels from Wikidata (cache-first, chunks fanned out
+    # over the shared pool; see resolve_qid_labels)
+    qid_labels = resolve_qid_labels(list(qid_order)) if qid_order else {}
+
+    # Enrich files, reusing the MID strings built above
+    for f, mid in zip(page_files, mids):
+        if mid in file_to_qids:
+            f["depicts"] = [
+                {"id": q, "label": qid_labels.get(q, q)}
+                for q in file_to_qids[mid]
+            ]
+
+_EMPTY = {}
+
+def _file_payload(page_id, page_data):
+    """Builds one per-file result dict. Kept as a single flat pass because
+    this runs for every file of every search response (50-200 per request)."""
+    info = page_data.get("imageinfo", [_EMPTY])[0]
+    return {
+        "pageid": page_id,
+        "title": page_data["title"],
+        "url": info.get("url"),
+        "thumb_url": info.get("thumburl") or info.get("url"),
+        "description": (info.get("extmetadata") or _EMPTY).get("ImageDescription", _EMPTY).get("value", "No description"),
+        "depicts": [] # Initialize
+    }
+
+def _encode_cursor(state):
+    return base64.urlsafe_b64encode(orjson.dumps(state)).decode()
+
+def _decode_cursor(token):
+    return orjson.loads(base64.urlsafe_b64decode(token.encode()))
+
+def _cursor_search_impl(cat_title, cursor_token):
+    """
+    Cursor ("seek") pagination via the API's gcmcontinue token: every page
+    costs one categorymembers fetch, unlike the legacy ?page=N path which
+    re-fetches from the start and grows with the page number. Main category
+    files only - the depth-1 subcategory recursion has no stable cursor, so
+    that hybrid behaviour stays on the legacy path. Pass cursor=start for
+    the first page, then the next_cursor from each response.
+    """
+    if cursor_token == "start":
+        state = {"cat": cat_title, "continue": None}
+    else:
+        try:
+            state = _decode_cursor(cursor_token)
+        except Exception:
+            return jsonify({"error": "Invalid cursor"}), 400
+
+    cat_title = state.get("cat", cat_title)
+    params = {
+        "action": "query",
+        "generator": "categorymembers",
+        "gcmtitle": cat_title,
+        "gcmtype": "file",
+        "gcmlimit": str(PER_PAGE),
+        "prop": "imageinfo",
+        "iiprop": "url|extmetadata",
+        "iiurlwidth": "320",
+        "iiextmetadatafilter": "ImageDescription",
+        "iiextmetadatalanguage": "en",
+        "iiextmetadatamultilang": "0",
+        "format": "json"
+    }
+    if state.get("continue"):
+        params["gcmcontinue"] = state["continue"]
+
+    data = _get_json(COMMONS_HTTP, COMMONS_API, params)
+
+    files = []
+    if "query" in data and "pages" in data["query"]:
+        for page_id, p_data in data["query"]["pages"].items():
+            if p_data["ns"] == 6 and "imageinfo" in p_data:
+                files.append(_file_payload(str(page_id), p_data))
+
+    gcm_continue = data.get("continue", {}).get("gcmcontinue")
+    next_cursor = _encode_cursor({"cat": cat_title, "continue": gcm_continue}) if gcm_continue else None
+
+    _attach_depicts(files)
+
+    return jsonify({
+        "results": files,
+        "has_next": next_cursor is not None,
+        "next_cursor": next_cursor,
+        "found_entity": {
+            "id": cat_title,
+            "label": cat_title,
+            "description": "Wikimedia Commons Category"
+        }
+    })
 
 def _search_impl():
     """
@@ -152,53 +683,80 @@ def _search_impl():
     if not cat_title.lower().startswith("category:"):
         cat_title = f"Category:{cat_title}"
 
+    # Token-based pagination path: one fetch per page via gcmcontinue.
+    cursor_token = request.args.get("cursor")
+    if cursor_token:
+        return _cursor_search_impl(cat_title, cursor_token)
+
     files = []
-    
-    PER_PAGE = 10
+
     target_count = page * PER_PAGE
     # We fetch one extra item to check if there is a next page
     needed_count = target_count + 1
     
-    # Helper to fetch members
-    def fetch_members(title, limit=50):
+    # Helper to fetch members (async so subcategory fetches can overlap)
+    async def fetch_members(http, title, limit=50):
         params = {
             "action": "query",
             "generator": "categorymembers",
             "gcmtitle": title,
             "gcmtype": "file|subcat",
-            "gcmlimit": limit, # Dynamic limit
+            "gcmlimit": str(limit), # Dynamic limit
             "prop": "imageinfo",
             "iiprop": "url|extmetadata",
-            "iiurlwidth": 320,
+            "iiurlwidth": "320",
+            # We only ever read ImageDescription; without the filter the API
+            # ships dozens of large localized extmetadata fields per file.
+            "iiextmetadatafilter": "ImageDescription",
+            "iiextmetadatalanguage": "en",
+            "iiextmetadatamultilang": "0",
             "format": "json"
         }
-        return requests.get(COMMONS_API, params=params, headers={"User-Agent": USER_AGENT}).json()
+        async with http.get(COMMONS_API, params=params) as resp:
+            return await resp.json(loads=orjson.loads)
 
     # 1. Fetch from Main Category
     # Allow fetching slightly more than strictly needed to account for non-files and potential recursion needs (though naive)
     # A true robust offset-based pagination would need a continuation token from MediaWiki API, but for this hybrid approach we'll fetch up to 'needed_count' + buffer
     # Since we can't reliably jump to an offset without a token, we re-fetch from start. This is inefficient for deep pages but consistent.
-    
+
     fetch_limit = min(needed_count + 50, 500) # Cap at 500
-    
-    data = fetch_members(cat_title, limit=fetch_limit)
-    subcats = []
+
+    async def fetch_category_tree():
+        """
+        Fetch the main category, then (if it can't fill the page) the first
+        5 subcategories concurrently. One connector so TLS state is shared.
+        """
+        connector = aiohttp.TCPConnector(limit=16)
+        async with aiohttp.ClientSession(connector=connector, headers={"User-Agent": USER_AGENT}) as http:
+            main_data = await fetch_members(http, cat_title, limit=fetch_limit)
+
+            file_count = 0
+            found_subcats = []
+            if "query" in main_data and "pages" in main_data["query"]:
+                for p_data in main_data["query"]["pages"].values():
+                    if p_data["ns"] == 6 and "imageinfo" in p_data:
+                        file_count += 1
+                    elif p_data["ns"] == 14:
+                        found_subcats.append(p_data["title"])
+
+            sub_datas = []
+            if file_count < needed_count and found_subcats:
+                remaining = needed_count - file_count
+                sub_limit = min(remaining + 20, 500)
+                sub_datas = await asyncio.gather(
+                    *[fetch_members(http, c, limit=sub_limit) for c in found_subcats[:5]]
+                )
+            return main_data, sub_datas
+
+    data, sub_datas = asyncio.run(fetch_category_tree())
     seen_pageids = set()
 
     def add_file(page_id, page_data):
         page_id_str = str(page_id)
         if page_id_str in seen_pageids:
             return
-        
-        info = page_data.get("imageinfo", [{}])[0]
-        files.append({
-            "pageid": page_id_str,
-            "title": page_data["title"],
-            "url": info.get("url"),
-            "thumb_url": info.get("thumburl", info.get("url")),
-            "description": info.get("extmetadata", {}).get("ImageDescription", {}).get("value", "No description"),
-            "depicts": [] # Initialize
-        })
+        files.append(_file_payload(page_id_str, page_data))
         seen_pageids.add(page_id_str)
 
     if "query" in data and "pages" in data["query"]:
@@ -206,28 +764,17 @@ def _search_impl():
             if p_data["ns"] == 6: # File
                 if "imageinfo" in p_data:
                      add_file(page_id, p_data)
-            elif p_data["ns"] == 14: # Category
-                subcats.append(p_data["title"])
 
     # 2. Simple Recursion (Depth 1) - If needed
-    # Only recurse if we haven't met the target for the CURRENT page AND future checks
-    
-    # Recursion Strategy: If we have enough files for this page + next indicator, stop.
-    if len(files) < needed_count:
-        for subcat in subcats[:5]: # Search first 5 subcats
-            if len(files) >= needed_count:
-                break
-            
-            # Fetch remaining needed
-            remaining = needed_count - len(files)
-            # Fetch a batch from subcat
-            sub_limit = min(remaining + 20, 500)
-            
-            sub_data = fetch_members(subcat, limit=sub_limit)
-            if "query" in sub_data and "pages" in sub_data["query"]:
-                 for page_id, p_data in sub_data["query"]["pages"].items():
-                    if p_data["ns"] == 6 and "imageinfo" in p_data:
-                         add_file(page_id, p_data)
+    # The subcategory responses were already fetched concurrently above;
+    # merge them in order until we have enough for this page + next indicator.
+    for sub_data in sub_datas:
+        if len(files) >= needed_count:
+            break
+        if "query" in sub_data and "pages" in sub_data["query"]:
+             for page_id, p_data in sub_data["query"]["pages"].items():
+                if p_data["ns"] == 6 and "imageinfo" in p_data:
+                     add_file(page_id, p_data)
     
     # Determine result slice
     start_idx = (page - 1) * PER_PAGE
@@ -239,60 +786,7 @@ def _search_impl():
     current_page_files = files[start_idx:end_idx]
 
     # 3. Batch Fetch Depicts (P180) - ONLY for the sliced files
-    if current_page_files:
-        # Get M-IDs
-        mids = [f"M{f['pageid']}" for f in current_page_files]
-        
-        # Batch fetch SDC from Commons
-        s_params = {
-            "action": "wbgetentities",
-            "ids": "|".join(mids),
-            "format": "json"
-        }
-        s_resp = requests.get(COMMONS_API, params=s_params, headers={"User-Agent": USER_AGENT}).json()
-        
-        all_qids = set()
-        file_to_qids = {} # mid -> [qid, ...]
-
-        if "entities" in s_resp:
-            for mid, entity in s_resp["entities"].items():
-                p180 = []
-                claims = entity.get("statements", {}).get("P180", [])
-                for claim in claims:
-                    if claim.get("mainsnak", {}).get("snaktype") == "value":
-                        val = claim["mainsnak"]["datavalue"]["value"]
-                        if val.get("entity-type") == "item": # Should be item
-                             qid = val["id"]
-                             p180.append(qid)
-                             all_qids.add(qid)
-                file_to_qids[mid] = p180
-        
-        # Batch fetch Labels from Wikidata
-        qid_labels = {}
-        if all_qids:
-            q_list = list(all_qids)
-            for i in range(0, len(q_list), 50):
-                chunk = q_list[i:i+50]
-                wd_params = {
-                    "action": "wbgetentities",
-                    "ids": "|".join(chunk),
-                    "props": "labels",
-                    "languages": "en",
-                    "format": "json"
-                }
-                wd_resp = requests.get(WIKIDATA_API, params=wd_params, headers={"User-Agent": USER_AGENT}).json()
-                if "entities" in wd_resp:
-                    for qid, q_data in wd_resp["entities"].items():
-                        qid_labels[qid] = q_data.get("labels", {}).get("en", {}).get("value", qid)
-
-        # Enrich files
-        for f in current_page_files:
-            mid = f"M{f['pageid']}"
-            if mid in file_to_qids:
-                f["depicts"] = [
-                    {"id": q, "label": qid_labels.get(q, q)}
-                    for q in file_to_qids[mid]
-                ]
+    _attach_depicts(current_page_files)
 
     return jsonify({
         "results": current_page_files,
@@ -314,21 +808,26 @@ def file_details(pageid):
     # But let's fetch it properly via wbgetentities? 
     # Actually, simpler to look up by pageid directly on Commons API to get the M-ID concept or just use the pageid to find the entity.
     # SDC entities are conceptualized as 'M' + page_id.
-    
+
+    # Reject garbage before it reaches the shared wbgetentities batch: one
+    # malformed id fails the whole upstream call for every request coalesced
+    # into the same window (see _MidBatcher).
+    if not pageid.isdigit():
+        return jsonify({"error": "Invalid pageid"}), 400
+
     mid = f"M{pageid}"
-    
-    params = {
-        "action": "wbgetentities",
-        "ids": mid,
-        "format": "json"
-    }
-    
-    resp = requests.get(COMMONS_API, params=params, headers={"User-Agent": USER_AGENT}).json()
-    
-    if "entities" not in resp or mid not in resp["entities"]:
+
+    # QIDs the client already has labels for (e.g. from the search response);
+    # these are excluded from the network resolve.
+    known = {q for q in request.args.get("known", "").split(",") if q}
+
+    # One wbgetentities call shared with any other file_details requests in
+    # flight right now (see _MidBatcher).
+    entity = MID_BATCHER.fetch(mid)
+
+    if entity is None or "missing" in entity:
          return jsonify({"error": "Entity not found"}), 404
-         
-    entity = resp["entities"][mid]
+
     statements = entity.get("statements", {})
     
     depicts = []
@@ -344,24 +843,21 @@ def file_details(pageid):
                 if datavalue.get("type") == "wikibase-entityid":
                     qids.append(datavalue["value"]["id"])
             
-        # Bulk resolve QID labels from Wikidata
+        # Bulk resolve QID labels (cache-first; see resolve_qid_labels).
+        # Known QIDs are served straight from the memory tier when warm;
+        # misses (other worker, fresh restart) go back through the resolver,
+        # which satisfies them from the SQLite tier without extra network.
         if qids:
-            chunk_size = 50
             labels = {}
-            for i in range(0, len(qids), chunk_size):
-                chunk = qids[i:i+chunk_size]
-                wd_params = {
-                    "action": "wbgetentities",
-                    "ids": "|".join(chunk),
-                    "props": "labels",
-                    "languages": "en",
-                    "format": "json"
-                }
-                wd_resp = requests.get(WIKIDATA_API, params=wd_params, headers={"User-Agent": USER_AGENT}).json()
-                if "entities" in wd_resp:
-                     for qid, q_data in wd_resp["entities"].items():
-                         labels[qid] = q_data.get("labels", {}).get("en", {}).get("value", qid)
-            
+            if known:
+                with _label_cache_lock:
+                    for q in known:
+                        if q in _label_cache:
+                            labels[q] = _label_cache[q]
+            to_resolve = [q for q in qids if q not in labels]
+            if to_resolve:
+                labels.update(resolve_qid_labels(to_resolve))
+
             for qid in qids:
                 depicts.append({
                     "id": qid,
@@ -373,12 +869,37 @@ def file_details(pageid):
         "depicts": depicts
     })
 
+@app.route("/api/resolve")
+def resolve_labels():
+    """
+    Batch QID -> English label resolution (cache-first). Lets the frontend
+    resolve every label it needs for a page in one call instead of
+    per-file lookups.
+    """
+    qids_param = request.args.get("qids", "")
+    qids = [q for q in qids_param.replace("|", ",").split(",") if q]
+    if not qids:
+        return jsonify({})
+    return jsonify(resolve_qid_labels(qids[:500]))
+
+# Autocomplete queries repeat heavily while a user types; cache the
+# wbsearchentities results briefly. TTLCache isn't thread-safe, so reads
+# and writes go through the lock like the other shared caches.
+_WD_SEARCH_CACHE = TTLCache(maxsize=1024, ttl=300)
+_wd_search_cache_lock = threading.Lock()
+
 @app.route("/api/wikidata_search")
 def wikidata_search():
     query = request.args.get("q")
     if not query:
         return jsonify([])
-        
+
+    cache_key = query.strip().lower()
+    with _wd_search_cache_lock:
+        cached = _WD_SEARCH_CACHE.get(cache_key)
+    if cached is not None:
+        return jsonify(cached)
+
     wd_params = {
         "action": "wbsearchentities",
         "search": query,
@@ -386,7 +907,7 @@ def wikidata_search():
         "format": "json",
         "limit": 10
     }
-    resp = requests.get(WIKIDATA_API, params=wd_params, headers={"User-Agent": USER_AGENT}).json()
+    resp = _get_json(WIKIDATA_HTTP, WIKIDATA_API, wd_params)
     results = []
     if "search" in resp:
         for item in resp["search"]:
@@ -395,53 +916,49 @@ def wikidata_search():
                 "label": item.get("label", item["id"]),
                 "description": item.get("description", "")
             })
+    with _wd_search_cache_lock:
+        _WD_SEARCH_CACHE[cache_key] = results
     return jsonify(results)
 
+_QID_RE = re.compile(r"^Q(\d+)$")
+_MID_RE = re.compile(r"^M(\d+)$")
+
 @app.route("/api/add_claim", methods=["POST"])
 def add_claim():
     """
     Adds a P180 statement to a MediaInfo entity.
     """
-    data = request.json
+    # silent=True: a missing/garbled body becomes our own 400 below instead
+    # of Flask's default HTML error page. Parsing goes through ORJSONProvider.
+    data = request.get_json(silent=True) or {}
     mid = data.get("mid")
     qid = data.get("qid")
-    
+
     if not mid or not qid:
         return jsonify({"error": "Missing info"}), 400
-        
+
+    # Strict id validation: both arrive as arbitrary JSON values, so check
+    # the type before matching (re raises TypeError on non-strings), and
+    # int(qid.replace("Q", "")) silently accepted malformed ids like "QQ1".
+    if not isinstance(mid, str) or not _MID_RE.match(mid):
+        return jsonify({"error": "Invalid mid"}), 400
+    m = _QID_RE.match(qid) if isinstance(qid, str) else None
+    if not m:
+        return jsonify({"error": "Invalid qid"}), 400
+    numeric_id = int(m.group(1))
+
     if not BOT_USERNAME or not BOT_PASSWORD:
         return jsonify({"error": "Server not configured with bot credentials"}), 500
 
     try:
-        session = get_commons_session()
-        csrf_token = get_csrf_token(session)
-        
-        # Determine value snak
-        value = {
-            "entity-type": "item",
-            "numeric-id": int(qid.replace("Q", ""))
-        }
-        
-        # https://www.mediawiki.org/wiki/Wikibase/API#wbcreateclaim
-        params = {
-            "action": "wbcreateclaim",
-            "entity": mid,
-            "property": "P180",
-            "snaktype": "value",
-            "value": str(jsonify(value).data, 'utf-8') if isinstance(value, str) else str(value).replace("'", '"'), # Tricky part, requests handles dicts usually but wb APIs can be finicky with JSON encoding of values
-            "bot": 1,
-            "token": csrf_token,
-            "format": "json"
-        }
-        
-        # Actually requests handles json value encoding if passed as string
-        # Correct format for 'value' in wbcreateclaim is a JSON string stringifying the datavalue content object?
-        # No, for 'value' parameter in `wbcreateclaim`:
-        # "The value to set the snak to. JSON encoding of the value as expected by the datatype ... For 'wikibase-item': '{"entity-type":"item","numeric-id":1}'"
-        
-        import json
-        json_value = json.dumps(value)
-        
+        session, csrf_token = get_authed_session()
+
+        # Per https://www.mediawiki.org/wiki/Wikibase/API#wbcreateclaim the
+        # 'value' parameter is the JSON-encoded datavalue content, e.g.
+        # '{"entity-type":"item","numeric-id":1}'. numeric_id is a validated
+        # int, so the string can be built directly.
+        json_value = f'{{"entity-type":"item","numeric-id":{numeric_id}}}'
+
         post_data = {
             "action": "wbcreateclaim",
             "entity": mid,
@@ -455,10 +972,22 @@ def add_claim():
         
         api_resp = session.post(COMMONS_API, data=post_data)
         resp_json = api_resp.json()
-        
+
+        # The cached login can go stale; re-authenticate once and retry.
+        if resp_json.get("error", {}).get("code") in ("badtoken", "assertuserfailed"):
+            invalidate_authed_session()
+            session, csrf_token = get_authed_session()
+            post_data["token"] = csrf_token
+            resp_json = session.post(COMMONS_API, data=post_data).json()
+
         if "error" in resp_json:
             return jsonify({"error": resp_json["error"]["info"]}), 400
-            
+
+        # The statement list for this MID just changed; drop the cached copy
+        # so the next search/page load re-fetches it.
+        with _sdc_cache_lock:
+            SDC_CACHE.pop(mid, None)
+
         return jsonify({"success": True, "data": resp_json})
         
     except Exception as e:
@@ -466,57 +995,194 @@ def add_claim():
 
 # --- Local Gallery Routes ---
 
+def _process_upload(image_id, raw):
+    """Pool worker: runs process_image for a pending row and flips it to
+    ready (or failed). Runs outside the request, so it needs its own app
+    context for the DB update."""
+    try:
+        original_fn, thumb_fn = process_image(io.BytesIO(raw))
+        status, filenames = "ready", (original_fn, thumb_fn)
+    except Exception:
+        # The client only ever sees status=failed via polling, so the trace
+        # has to land in the server log or the failure is undiagnosable.
+        app.logger.exception("upload processing failed for image %s", image_id)
+        status, filenames = "failed", (None, None)
+
+    with app.app_context():
+        row = db.session.get(ImageModel, image_id)
+        if row:
+            row.filename, row.thumbnail_filename = filenames
+            row.status = status
+            db.session.commit()
+
 @app.route("/api/upload", methods=["POST"])
 def upload_image():
     if 'file' not in request.files:
         return jsonify({"error": "No file part"}), 400
-    file = request.files['file']
-    if file.filename == '':
+    files = [f for f in request.files.getlist('file') if f and f.filename]
+    if not files:
         return jsonify({"error": "No selected file"}), 400
-    
-    if file:
-        try:
-            original_fn, thumb_fn = process_image(file)
-            
+
+    try:
+        # Read the uploads into memory and insert all pending rows under a
+        # single commit — one WAL fsync for the whole batch instead of one
+        # per image. The CPU-heavy processing goes to the pool; the client
+        # gets 202 with the row ids right away and polls
+        # /api/upload_status/<id>.
+        title = request.form.get("title")
+        pending = []
+        for file in files:
+            raw = file.stream.read()
             new_image = ImageModel(
-                filename=original_fn,
-                thumbnail_filename=thumb_fn,
-                title=request.form.get("title", file.filename)
+                title=title or file.filename,
+                status="pending"
             )
             db.session.add(new_image)
-            db.session.commit()
-            
-            return jsonify({"success": True, "image": new_image.to_dict()}), 201
-        except Exception as e:
-            return jsonify({"error": str(e)}), 500
-    
-    return jsonify({"error": "Upload failed"}), 400
+            pending.append((new_image, raw))
+        db.session.commit()
+        for new_image, raw in pending:
+            IMG_POOL.submit(_process_upload, new_image.id, raw)
+
+        images = [new_image.to_dict() for new_image, _ in pending]
+        return jsonify({"success": True, "image": images[0], "images": images}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/upload_status/<int:image_id>", methods=["GET"])
+def upload_status(image_id):
+    row = db.session.get(ImageModel, image_id)
+    if row is None:
+        return jsonify({"error": "Not found"}), 404
+    return jsonify(row.to_dict())
+
+STATIC_PREFIX = "/static/images/"
+
+# Columns the gallery payload needs; selecting these directly returns plain
+# Rows and skips ORM instance construction per image.
+_IMAGE_COLS = (ImageModel.id, ImageModel.title, ImageModel.filename,
+               ImageModel.thumbnail_filename, ImageModel.status)
+
+def _image_row_dict(row):
+    """Builds the gallery payload dict from a plain column Row."""
+    return {
+        "id": row.id,
+        "title": row.title,
+        "status": row.status,
+        "original_url": STATIC_PREFIX + row.filename if row.filename else None,
+        "thumbnail_url": STATIC_PREFIX + row.thumbnail_filename if row.thumbnail_filename else None
+    }
+
+def _json_bytes(payload, status=200):
+    """orjson-encoded Response; skips the bytes->str->bytes round trip the
+    provider pays inside jsonify."""
+    return Response(orjson.dumps(payload), status=status, mimetype="application/json")
+
+# The legacy ?page=N path needs a total count, which is a full scan on
+# SQLite; 60 seconds of staleness is fine for gallery pagination metadata.
+# Lock-guarded like the other shared TTLCaches (cachetools isn't thread-safe).
+_IMAGE_COUNT_CACHE = TTLCache(maxsize=1, ttl=60)
+_image_count_lock = threading.Lock()
+
+def _image_count():
+    with _image_count_lock:
+        total = _IMAGE_COUNT_CACHE.get("total")
+    if total is None:
+        total = db.session.execute(
+            db.select(db.func.count()).select_from(ImageModel)).scalar()
+        with _image_count_lock:
+            _IMAGE_COUNT_CACHE["total"] = total
+    return total
 
 @app.route("/api/images", methods=["GET"])
 def get_images():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
-    
-    pagination = db.paginate(db.select(ImageModel), page=page, per_page=per_page)
-    
-    return jsonify({
-        "images": [img.to_dict() for img in pagination.items],
+    after_id = request.args.get('after_id', type=int)
+
+    # Keyset ("seek") pagination: O(per_page) via the rowid index, and no
+    # COUNT(*) table scan. Pass after_id=0 to start from the newest image;
+    # subsequent pages pass the next_after_id from the previous response.
+    if after_id is not None:
+        stmt = db.select(*_IMAGE_COLS).order_by(ImageModel.id.desc()).limit(per_page + 1)
+        if after_id:
+            stmt = stmt.where(ImageModel.id < after_id)
+        rows = db.session.execute(stmt).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        return _json_bytes({
+            "images": [_image_row_dict(r) for r in rows],
+            "meta": {
+                "has_next": has_next,
+                "next_after_id": rows[-1].id if (rows and has_next) else None
+            }
+        })
+
+    # Legacy offset pagination (COUNT comes from a short-lived cache)
+    total = _image_count()
+    rows = db.session.execute(
+        db.select(*_IMAGE_COLS).order_by(ImageModel.id)
+        .offset((page - 1) * per_page).limit(per_page)).all()
+
+    return _json_bytes({
+        "images": [_image_row_dict(r) for r in rows],
         "meta": {
-            "total_pages": pagination.pages,
+            "total_pages": (total + per_page - 1) // per_page,
             "current_page": page,
-            "has_next": pagination.has_next,
-            "total_items": pagination.total
+            "has_next": page * per_page < total,
+            "total_items": total
         }
     })
 
+# When set (e.g. "/_protected_images"), uploaded images are delivered by the
+# reverse proxy via X-Accel-Redirect instead of streaming through Python:
+#   location /_protected_images/ { internal; alias /path/to/static/images/; }
+# The kernel's sendfile path then moves the bytes and the WSGI worker is free.
+IMAGE_ACCEL_PREFIX = os.getenv("IMAGE_ACCEL_PREFIX")
+
 @app.route('/static/images/<path:filename>')
 def serve_static_image(filename):
-    response = send_from_directory(app.config['UPLOAD_FOLDER'], filename)
-    # Cache for 1 year
-    response.headers['Cache-Control'] = 'public, max-age=31536000'
+    # Filenames are uuid-hex, so content under a given name never changes;
+    # immutable lets browsers skip revalidation for the whole year.
+    cache_control = 'public, max-age=31536000, immutable'
+
+    if IMAGE_ACCEL_PREFIX:
+        response = Response(mimetype='image/webp')
+        response.headers['X-Accel-Redirect'] = f"{IMAGE_ACCEL_PREFIX}/{secure_filename(filename)}"
+        response.headers['Cache-Control'] = cache_control
+        # The UUID filename is the content identity, so it doubles as a
+        # stable ETag without touching the file.
+        response.set_etag(hashlib.md5(filename.encode()).hexdigest())
+        return response.make_conditional(request)
+
+    # Dev path: let Flask emit 304s off the file's mtime/size ETag.
+    response = send_from_directory(
+        app.config['UPLOAD_FOLDER'], filename,
+        conditional=True, max_age=31536000)
+    response.headers['Cache-Control'] = cache_control
     return response
 
 if __name__ == "__main__":
     with app.app_context():
         db.create_all()
+        # Lightweight migration for galleries created before the status column
+        try:
+            db.session.execute(db.text(
+                "ALTER TABLE image_model ADD COLUMN status VARCHAR(20) NOT NULL DEFAULT 'ready'"))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+        # Old tables declared filename NOT NULL, which breaks the pending-row
+        # insert of the async upload flow. SQLite can't drop a NOT NULL in
+        # place, so rebuild the table the standard rename/copy/drop way.
+        info = db.session.execute(db.text("PRAGMA table_info(image_model)")).fetchall()
+        if any(col[1] == "filename" and col[3] for col in info):
+            db.session.execute(db.text("ALTER TABLE image_model RENAME TO image_model_old"))
+            db.session.commit()
+            db.create_all()
+            db.session.execute(db.text(
+                "INSERT INTO image_model (id, filename, thumbnail_filename, title, status) "
+                "SELECT id, filename, thumbnail_filename, title, status FROM image_model_old"))
+            db.session.execute(db.text("DROP TABLE image_model_old"))
+            db.session.commit()
+        warm_label_cache()
     app.run(debug=True, port=5000)
@@ -131,8 +131,10 @@ async function openSplitView(file) {
     resetAddForm();
 
     // Fetch Details to get M-ID and Depicts
+    // Pass the QIDs we already have labels for so the server skips re-resolving them
     try {
-        const res = await fetch(`/api/file/${file.pageid}`);
+        const knownQids = (file.depicts || []).map(d => d.id).join(',');
+        const res = await fetch(`/api/file/${file.pageid}?known=${encodeURIComponent(knownQids)}`);
         const data = await res.json();
 
         currentMediaId = data.mid;